@@ -3,34 +3,265 @@
 Pre-commit hook to check for sensitive data in TOML files.
 Prevents commits if unredacted sensitive data is found.
 Uses the published wso2-tools repository.
+
+A local copy of toml_redactor.py (pointed to by $TOML_REDACTOR, or
+importable e.g. next to this hook) is used as-is, without any download.
 """
 
 import sys
 import subprocess
-import tempfile
+import concurrent.futures
+import contextlib
+import hashlib
+import http.client
+import importlib.util
+import io
+import json
+import mmap
 import os
+import re
+import tempfile
+import time
 from pathlib import Path
 
+REDACTOR_HOST = "raw.githubusercontent.com"
+REDACTOR_PATH = "/isamauny-wso2/wso2-tools/main/tomlTools/toml_redactor.py"
+REDACTOR_URL = f"https://{REDACTOR_HOST}{REDACTOR_PATH}"
+# Run the redactor with the interpreter running this hook, no PATH lookup
+PY = sys.executable
+# An empty or relative XDG_CACHE_HOME counts as unset, per the XDG base
+# directory spec, so the cache never lands in the repository being committed
+_XDG_CACHE_HOME = os.environ.get("XDG_CACHE_HOME")
+if not _XDG_CACHE_HOME or not os.path.isabs(_XDG_CACHE_HOME):
+    _XDG_CACHE_HOME = Path.home() / ".cache"
+CACHE_DIR = Path(_XDG_CACHE_HOME) / "wso2-tools"
+CACHE_MAX_AGE = 24 * 60 * 60  # Re-validate the cached redactor once a day
+CLEAN_CACHE_FILE = CACHE_DIR / "clean.json"
+# Summary the redactor reports on stderr when a file needs no changes
+REDACTOR_CLEAN = "Redacted 0 sensitive fields"
+
+# Files without any of these can't contain fields the redactor would touch
+SENSITIVE_HINTS = re.compile(rb"passw|secret|token|key|credential", re.IGNORECASE)
+
+def _atomic_write(path, data):
+    """Write data next to path and rename it into place, so readers never see a partial file."""
+    f = tempfile.NamedTemporaryFile(dir=path.parent, suffix=".tmp", delete=False)
+    try:
+        with f:
+            f.write(data)
+        os.replace(f.name, path)
+    except BaseException:
+        # Disk full, EIO or a failed rename: don't leave the .tmp file behind
+        with contextlib.suppress(OSError):
+            os.unlink(f.name)
+        raise
+
+_connection = None
+
+def _get_connection():
+    """Return the shared keep-alive HTTPS connection to GitHub raw."""
+    global _connection
+    if _connection is None:
+        _connection = http.client.HTTPSConnection(REDACTOR_HOST, timeout=10)
+    return _connection
+
+def find_local_redactor():
+    """Return a locally provided redactor script, or None to download one."""
+    local_script = os.environ.get("TOML_REDACTOR")
+    if local_script and os.path.isfile(local_script):
+        return os.path.abspath(local_script)
+
+    # Vendored next to this hook or installed alongside it
+    spec = importlib.util.find_spec("toml_redactor")
+    if spec and spec.origin and spec.origin.endswith(".py"):
+        return spec.origin
+    return None
+
 def download_redactor():
-    """Download the redactor script from GitHub."""
+    """Return the cached redactor script, refreshing it from GitHub when stale."""
+    script_path = CACHE_DIR / "toml_redactor.py"
+    etag_path = CACHE_DIR / "toml_redactor.py.etag"
+
     try:
-        # Create a temporary directory
-        temp_dir = tempfile.mkdtemp()
-        script_path = os.path.join(temp_dir, "toml_redactor.py")
-
-        # Download the script using curl
-        result = subprocess.run([
-            "curl", "-s", "-o", script_path,
-            "https://raw.githubusercontent.com/isamauny-wso2/wso2-tools/main/tomlTools/toml_redactor.py"
-        ], capture_output=True)
-
-        if result.returncode == 0 and os.path.exists(script_path):
-            return script_path
-        else:
-            return None
+        # Reuse the cached copy while it is fresh
+        try:
+            if time.time() - script_path.stat().st_mtime < CACHE_MAX_AGE:
+                return str(script_path)
+        except OSError:
+            pass
+
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        headers = {}
+        if script_path.exists() and etag_path.exists():
+            headers["If-None-Match"] = etag_path.read_text().strip()
+
+        connection = _get_connection()
+        connection.request("GET", REDACTOR_PATH, headers=headers)
+        response = connection.getresponse()
+        # Always drain the body so the connection can be reused
+        data = response.read()
+
+        if response.status == 304:
+            # Unchanged upstream, just mark the cached copy as fresh again
+            os.utime(script_path)
+            return str(script_path)
+        if response.status != 200:
+            raise OSError(f"HTTP {response.status} fetching {REDACTOR_URL}")
+        etag = response.getheader("ETag")
+
+        _atomic_write(script_path, data)
+        if etag:
+            _atomic_write(etag_path, etag.encode())
+        elif etag_path.exists():
+            etag_path.unlink()
+        return str(script_path)
     except Exception:
+        # Offline or GitHub unreachable, fall back to a stale copy if we have one
+        if script_path.exists():
+            return str(script_path)
         return None
 
+def _has_candidate(toml_file):
+    """Cheap byte scan for anything that looks like a sensitive key."""
+    try:
+        with open(toml_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            return SENSITIVE_HINTS.search(m) is not None
+    except ValueError:
+        # Empty files can't be mapped and have nothing to redact
+        return False
+    except OSError:
+        # Let the redactor report unreadable files
+        return True
+
+def _load_clean_cache(redactor_digest):
+    """Load the hashes of files already found clean by this exact redactor."""
+    try:
+        cache = json.loads(CLEAN_CACHE_FILE.read_text())
+        if cache.get("redactor") == redactor_digest and isinstance(cache["files"], dict):
+            return cache["files"]
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass
+    # Missing, unreadable, malformed, or written by a different redactor version
+    return {}
+
+def _save_clean_cache(redactor_digest, clean_files):
+    """Rewrite the clean-file cache."""
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        _atomic_write(CLEAN_CACHE_FILE, json.dumps({"redactor": redactor_digest, "files": clean_files}).encode())
+    except OSError:
+        pass
+
+_redactor_modules = {}
+
+def _load_redactor(redactor_script):
+    """Import the redactor script once per process, None if it can't be imported."""
+    if redactor_script not in _redactor_modules:
+        try:
+            spec = importlib.util.spec_from_file_location("toml_redactor", redactor_script)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            if not callable(getattr(module, "main", None)):
+                module = None
+        except Exception:
+            module = None
+        _redactor_modules[redactor_script] = module
+    return _redactor_modules[redactor_script]
+
+def _run_redactor_main(module, toml_file):
+    """Call the redactor's main() as if run from the command line, capturing stderr."""
+    stderr = io.StringIO()
+    saved_argv = sys.argv
+    sys.argv = [module.__file__, toml_file, "--report"]
+    try:
+        with open(os.devnull, "w") as devnull, \
+                contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(stderr):
+            try:
+                returncode = module.main()
+            except SystemExit as e:
+                returncode = e.code
+                if returncode is not None and not isinstance(returncode, int):
+                    print(returncode, file=sys.stderr)
+                    returncode = 1
+    finally:
+        sys.argv = saved_argv
+
+    return returncode or 0, stderr.getvalue()
+
+def _check_one(args):
+    """
+    Run the redactor in report mode (no file changes) on a single file.
+
+    The redactor is imported and called in-process when possible, falling
+    back to running it as a script when it can't be imported or doesn't
+    report the file clean in-process. Kept at module level so it can be
+    pickled for the process pool. Returns (toml_file, returncode, stderr);
+    returncode is None when the redactor could not be run at all.
+    """
+    redactor_script, toml_file = args
+    try:
+        module = _load_redactor(redactor_script)
+        if module is not None:
+            returncode, stderr = _run_redactor_main(module, toml_file)
+            # Only trust a clean summary; anything else is confirmed by running
+            # the script. A redactor that bound stderr at import time (e.g.
+            # logging) writes its summary past the capture, and module state
+            # such as counters carries over between files in one process
+            if returncode == 0 and REDACTOR_CLEAN in stderr:
+                return toml_file, returncode, stderr
+
+        # Only the stderr summary matters, discard the redacted output on stdout
+        with subprocess.Popen([
+            PY, redactor_script, toml_file, "--report"
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, bufsize=1) as process:
+            stderr_lines = list(process.stderr)
+        return toml_file, process.returncode, "".join(stderr_lines)
+    except Exception as e:
+        return toml_file, None, str(e)
+
+# The exact option token, so e.g. "--server-url" doesn't count
+SERVE_OPTION = re.compile(r"(?<![\w-])--serve(?![\w-])")
+
+def _supports_serve(redactor_script):
+    """Check whether the redactor advertises the line-oriented --serve mode."""
+    try:
+        return SERVE_OPTION.search(Path(redactor_script).read_text(encoding="utf-8")) is not None
+    except (OSError, UnicodeDecodeError):
+        return False
+
+def _check_served(redactor_script, toml_files):
+    """
+    Check all files through a single redactor started with --serve.
+
+    File paths are written to its stdin one per line; it answers each with
+    "OK" or "FAIL: <report>". On any other (or no) answer the remaining
+    files are checked one by one with _check_one(). Returns the same tuples
+    as _check_one().
+    """
+    results = []
+    try:
+        with subprocess.Popen(
+                [PY, redactor_script, "--serve"], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL, text=True, bufsize=1) as process:
+            for toml_file in toml_files:
+                process.stdin.write(toml_file + "\n")
+                process.stdin.flush()
+                response = process.stdout.readline().strip()
+                if response == "OK":
+                    results.append((toml_file, 0, REDACTOR_CLEAN))
+                elif response.startswith("FAIL:"):
+                    results.append((toml_file, 0, response[len("FAIL:"):].strip()))
+                else:
+                    # Stop talking to it, it may never exit on its own
+                    process.kill()
+                    break
+            process.stdin.close()
+    except Exception:
+        pass
+    # Serve mode not actually supported, or the redactor went away mid-run
+    results.extend(_check_one((redactor_script, toml_file)) for toml_file in toml_files[len(results):])
+    return results
+
 def main():
     """Check TOML files for sensitive data before commit."""
     if len(sys.argv) < 2:
@@ -43,47 +274,81 @@ def main():
     if not toml_files:
         return 0
 
-    # Download the redactor script
-    redactor_script = download_redactor()
+    # Only files mentioning sensitive-looking keys need the full redactor pass
+    candidate_files = []
+    for toml_file in toml_files:
+        if _has_candidate(toml_file):
+            candidate_files.append(toml_file)
+        else:
+            print(f"✅ {toml_file}: No sensitive data found")
+
+    if not candidate_files:
+        print(f"\n✅ All {len(toml_files)} TOML file(s) are clean!")
+        return 0
+
+    # Prefer a local redactor, otherwise download (or reuse the cached copy)
+    redactor_script = find_local_redactor() or download_redactor()
     if not redactor_script:
         print("❌ Failed to download TOML redactor script")
         print("Please check your internet connection or install manually:")
         print("https://github.com/isamauny-wso2/wso2-tools/blob/main/tomlTools/toml_redactor.py")
         return 1
 
+    # Skip files whose exact content this redactor has already passed
+    redactor_digest = hashlib.sha256(Path(redactor_script).read_bytes()).hexdigest()
+    clean_cache = _load_clean_cache(redactor_digest)
+    file_hashes = {}
+    tasks = []
+    for toml_file in candidate_files:
+        try:
+            file_hashes[toml_file] = hashlib.sha256(Path(toml_file).read_bytes()).hexdigest()
+        except OSError:
+            pass
+        if clean_cache.get(file_hashes.get(toml_file)) == "clean":
+            print(f"✅ {toml_file}: No sensitive data found")
+        else:
+            tasks.append((redactor_script, toml_file))
+
+    # Import the redactor up front so forked pool workers inherit it
+    redactor_module = _load_redactor(redactor_script) if tasks else None
+
     failed_files = []
+    newly_clean = False
 
-    try:
-        for toml_file in toml_files:
-            # Run the redactor in report mode (no file changes)
-            try:
-                result = subprocess.run([
-                    "python3", redactor_script, toml_file, "--report"
-                ], capture_output=True, text=True)
-
-                if result.returncode == 0:
-                    # Check if any redactions would be made
-                    if "Redacted 0 sensitive fields" not in result.stderr:
-                        failed_files.append(toml_file)
-                        print(f"❌ {toml_file}: Contains sensitive data that needs redaction")
-                        print(result.stderr.strip())
-                    else:
-                        print(f"✅ {toml_file}: No sensitive data found")
-                else:
-                    failed_files.append(toml_file)
-                    print(f"❌ Error checking {toml_file}: {result.stderr}")
-            except Exception as e:
-                print(f"❌ Error checking {toml_file}: {e}")
+    if tasks and redactor_module is None and _supports_serve(redactor_script):
+        # Can't import it here, but one long-lived redactor beats one per file
+        results = _check_served(redactor_script, [toml_file for _, toml_file in tasks])
+    elif len(tasks) <= 1:
+        # Not worth paying the process pool startup for a single file
+        results = [_check_one(task) for task in tasks]
+    else:
+        # Hand each worker one contiguous batch of files so the redactor is
+        # imported once per worker and results come back in a single message
+        workers = min(len(tasks), os.cpu_count() or 1)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_check_one, tasks, chunksize=-(-len(tasks) // workers)))
+
+    for toml_file, returncode, stderr in results:
+        if returncode is None:
+            print(f"❌ Error checking {toml_file}: {stderr}")
+            failed_files.append(toml_file)
+        elif returncode == 0:
+            # Check if any redactions would be made
+            if REDACTOR_CLEAN not in stderr:
                 failed_files.append(toml_file)
+                print(f"❌ {toml_file}: Contains sensitive data that needs redaction")
+                print(stderr.strip())
+            else:
+                print(f"✅ {toml_file}: No sensitive data found")
+                if toml_file in file_hashes:
+                    clean_cache[file_hashes[toml_file]] = "clean"
+                    newly_clean = True
+        else:
+            failed_files.append(toml_file)
+            print(f"❌ Error checking {toml_file}: {stderr}")
 
-    finally:
-        # Clean up temporary file
-        try:
-            if redactor_script and os.path.exists(redactor_script):
-                os.remove(redactor_script)
-                os.rmdir(os.path.dirname(redactor_script))
-        except Exception:
-            pass
+    if newly_clean:
+        _save_clean_cache(redactor_digest, clean_cache)
 
     if failed_files:
         print(f"\n🚫 Commit blocked! {len(failed_files)} file(s) contain sensitive data.")
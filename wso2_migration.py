@@ -7,14 +7,20 @@ properties."moesifKey" stays within [apim.analytics] section
 """
 
 import argparse
+import copy
+import io
 import sys
 import shutil
 import re
 import json
+from collections import defaultdict
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Any, List, Tuple, Optional
-import toml
+from typing import Dict, Any, Iterator, List, Tuple, Optional
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    import tomli as tomllib
 
 
 # Configuration constants
@@ -26,6 +32,72 @@ DEFAULT_IGNORE_PATTERNS = {
 
 REQUIRED_SECTIONS = ['server', 'super_admin']
 DEFAULT_CONFIG_FILE = 'custom_migration_rules.json'
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+# Sentinel for single-lookup dict.get() calls, distinct from any config value
+_MISSING = object()
+
+# Parsed TOML files keyed by (path, mtime_ns, size)
+_PARSE_CACHE: Dict[Tuple[str, int, int], Dict[str, Any]] = {}
+
+
+# A '[table]' or '[[array.table]]' header filling the rest of the line; a line
+# such as '[[a]' falls through to the table branch with name '[a'
+_HEADER_PATTERN = r'''
+    \[ (?: \[ (?P<array>.*) \] | (?P<table>.*) ) \] \s*$
+'''
+
+# A section header, optionally commented out with a leading '#'
+_SEC_RE = re.compile(r'^\s*(?P<comment>\#?)' + _HEADER_PATTERN, re.VERBOSE)
+
+# One match per target line: a section header or a key-value pair, either of
+# which may be commented out with a leading '#'
+_LINE_RE = re.compile(r'''
+    ^\s*(?P<comment>\#?)
+    (?:
+        ''' + _HEADER_PATTERN + r'''
+      | \s*(?P<key>[^=]*?)\s*=
+    )
+''', re.VERBOSE)
+
+
+def _reject_non_toml_json(_value: Any) -> Any:
+    raise ValueError("JSON construct with no TOML equivalent")
+
+
+# Most TOML arrays (strings, numbers, booleans) are valid JSON with the same
+# meaning; objects and NaN/Infinity are not, so leave those to the TOML parser
+_JSON_ARRAY_DECODER = json.JSONDecoder(parse_constant=_reject_non_toml_json,
+                                       object_pairs_hook=_reject_non_toml_json)
+
+
+def _contains_none(value: Any) -> bool:
+    if value is None:
+        return True
+    return isinstance(value, list) and any(_contains_none(item) for item in value)
+
+
+def _decode_json_array(value_str: str) -> Any:
+    """
+    Decode an array literal with the JSON decoder, raising ValueError when the
+    result could differ from TOML's: JSON escapes ('\\/', lone surrogates)
+    are not TOML escapes and null has no TOML equivalent.
+    """
+    if '\\' in value_str:
+        raise ValueError("escape sequences are left to the TOML parser")
+    value = _JSON_ARRAY_DECODER.decode(value_str)
+    if _contains_none(value):
+        raise ValueError("JSON null has no TOML equivalent")
+    return value
+
+
+# Escapes for the parsed (unescaped) strings inside arrays when writing them
+# back as TOML basic strings: control characters TOML has no short escape
+# for (U+0000-U+001F, U+007F) are written as \uXXXX
+_STR_ESCAPE = str.maketrans({
+    **{chr(c): f'\\u{c:04X}' for c in (*range(0x20), 0x7F)},
+    '"': '\\"', '\\': '\\\\', '\b': '\\b', '\t': '\\t', '\n': '\\n', '\f': '\\f', '\r': '\\r',
+})
 
 
 class CorrectedTomlMigrator:
@@ -35,11 +107,18 @@ class CorrectedTomlMigrator:
         self.source_file = Path(source_file)
         self.target_file = Path(target_file)
         self.output_file = Path(output_file) if output_file else self.target_file.with_suffix('.migrated.toml')
-        self.applied_changes = []
+        # (change kind, section, key or None), formatted only when displayed
+        self.applied_changes: List[Tuple[str, str, Optional[str]]] = []
+        # Section headers written to the output by the last migration, and the
+        # keys written before the first header (dotted keys, inline tables)
+        self.emitted_sections: set = set()
+        self.emitted_top_level_keys: set = set()
         self.config = self._load_config(config_file or DEFAULT_CONFIG_FILE)
         self.ordering_rules = self.config.get('section_ordering', {})
         self.array_tables = set(self.ordering_rules.get('array_tables', []))
+        self._index_ordering_rules()
         self.ignore_patterns = self._parse_ignore_patterns(self.config.get('ignore_patterns', []))
+        self._exact_ignores, self._wild_ignores = self._compile_ignore_patterns(self.ignore_patterns)
 
     def _load_config(self, config_file: str) -> Dict[str, Any]:
         """Load configuration from JSON file."""
@@ -80,6 +159,22 @@ class CorrectedTomlMigrator:
 
         return parsed
 
+    def _compile_ignore_patterns(self, patterns: Dict[str, str]) -> Tuple[Dict[str, str], List[Tuple[re.Pattern, str]]]:
+        """
+        Split ignore patterns into exact keys and precompiled wildcard regexes.
+
+        Done once up front so matching never has to build a regex per property.
+        """
+        exact_ignores = {}
+        wild_ignores = []
+        for pattern_key, pattern_value in patterns.items():
+            if '*' in pattern_key:
+                pattern_regex = pattern_key.replace('.', r'\.').replace('*', r'[^.]+')
+                wild_ignores.append((re.compile(f'^{pattern_regex}$'), pattern_value))
+            else:
+                exact_ignores[pattern_key] = pattern_value
+        return exact_ignores, wild_ignores
+
     def _matches_ignore_pattern(self, full_key: str, value: Any) -> bool:
         """
         Check if a key-value pair matches any ignore pattern.
@@ -90,52 +185,59 @@ class CorrectedTomlMigrator:
         """
         value_str = str(value)
 
-        for pattern_key, pattern_value in self.ignore_patterns.items():
-            # Check if value matches
-            if value_str != pattern_value:
-                continue
+        if self._exact_ignores.get(full_key) == value_str:
+            return True
 
-            # Check if key matches (with wildcard support)
-            if '*' in pattern_key:
-                # Convert pattern to regex
-                pattern_regex = pattern_key.replace('.', r'\.').replace('*', r'[^.]+')
-                if re.match(f'^{pattern_regex}$', full_key):
-                    return True
-            elif full_key == pattern_key:
+        # Compare the value first, it's much cheaper than the regex
+        for pattern_regex, pattern_value in self._wild_ignores:
+            if pattern_value == value_str and pattern_regex.match(full_key):
                 return True
 
         return False
 
     def parse_toml_file(self, file_path: Path) -> Dict[str, Any]:
-        """Parse TOML file."""
+        """Parse TOML file, reusing the result while the file is unchanged."""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return toml.load(f)
+            stat = file_path.stat()
+            cache_key = (str(file_path), stat.st_mtime_ns, stat.st_size)
+            if cache_key not in _PARSE_CACHE:
+                _PARSE_CACHE[cache_key] = tomllib.loads(file_path.read_bytes().decode('utf-8'))
+            # Hand out a copy so callers can't modify the cached config
+            return copy.deepcopy(_PARSE_CACHE[cache_key])
         except Exception as e:
             print(f"Error parsing {file_path}: {e}")
             sys.exit(1)
 
     def read_file_as_lines(self, file_path: Path) -> List[str]:
         """Read file as list of lines."""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.readlines()
+        # Slurp the file in one read; StringIO only splits on '\n', unlike
+        # str.splitlines() which would also break on e.g. U+2028 in comments
+        return io.StringIO(Path(file_path).read_text(encoding='utf-8')).readlines()
 
     def extract_section_with_properties(self, lines: List[str]) -> Dict[str, Dict[str, Any]]:
         """Extract sections with their properties, including quoted properties."""
         sections = {}
         current_section = None
+        pending_arrays = []  # (container, key, raw array) to parse after the scan
 
         for line in lines:
             stripped = line.strip()
+            # Blank lines and comments carry nothing we extract
+            if not stripped:
+                continue
+            first = stripped[0]
+            if first == '#':
+                continue
 
-            # Section headers
-            if stripped.startswith('[') and stripped.endswith(']') and not stripped.startswith('#'):
+            # Section headers, names and keys are interned since they end up as
+            # keys of the dicts and sets that the apply loop probes for every line
+            if first == '[' and stripped[-1] == ']':
                 is_array_table = False
-                if stripped.startswith('[[') and stripped.endswith(']]'):
-                    current_section = stripped[2:-2].strip()
+                if stripped[1] == '[' and stripped[-2] == ']':
+                    current_section = sys.intern(stripped[2:-2].strip())
                     is_array_table = True
                 else:
-                    current_section = stripped[1:-1].strip()
+                    current_section = sys.intern(stripped[1:-1].strip())
                     # Check config to see if this should be an array table
                     is_array_table = current_section in self.array_tables
 
@@ -143,40 +245,83 @@ class CorrectedTomlMigrator:
                     sections[current_section] = {'regular_props': {}, 'quoted_props': [], 'is_array_table': is_array_table}
 
             # Key-value pairs
-            elif '=' in stripped and not stripped.startswith('#') and current_section:
-                key_part, value_part = stripped.split('=', 1)
-                key = key_part.strip()
-                value = value_part.strip()
+            elif current_section and '=' in stripped:
+                key_part, _, value_part = stripped.partition('=')
+                key = sys.intern(key_part.strip())
+                value = self._strip_inline_comment(value_part)
 
                 # Check if this is a quoted property
                 if key.startswith('properties."') and key.endswith('"'):
                     # This is a quoted property like properties."moesifKey"
-                    sections[current_section]['quoted_props'].append({
-                        'line': stripped,
-                        'key': key,
-                        'value': self.clean_toml_value(value)
-                    })
+                    container, container_key = {'line': stripped, 'key': key}, 'value'
+                    sections[current_section]['quoted_props'].append(container)
                 else:
                     # Regular property
-                    sections[current_section]['regular_props'][key] = self.clean_toml_value(value)
+                    container, container_key = sections[current_section]['regular_props'], key
+
+                if value.startswith('[') and value.endswith(']'):
+                    # Arrays are parsed all together once the scan is done
+                    container[container_key] = value
+                    pending_arrays.append((container, container_key, value))
+                else:
+                    container[container_key] = self.clean_toml_value(value)
+
+        if pending_arrays:
+            parsed_arrays = self._parse_toml_arrays([value for _, _, value in pending_arrays])
+            for (container, container_key, value), parsed in zip(pending_arrays, parsed_arrays):
+                # Skip properties that a later line has overwritten
+                if container[container_key] is value:
+                    container[container_key] = parsed
 
         return sections
 
-    def clean_toml_value(self, value_str: str) -> Any:
-        """Clean and parse a TOML value string."""
+    def _parse_toml_arrays(self, array_strs: List[str]) -> List[Any]:
+        """Parse many TOML array literals, trying the C JSON decoder first."""
+        parsed_arrays = []
+        toml_only = []  # Indexes of arrays that need the TOML parser
+        for i, value_str in enumerate(array_strs):
+            try:
+                parsed_arrays.append(_decode_json_array(value_str))
+            except ValueError:
+                parsed_arrays.append(value_str)
+                toml_only.append(i)
+
+        if toml_only:
+            # Parse everything else together with a single parser call
+            document = ''.join(f"v{i} = {array_strs[i]}\n" for i in toml_only)
+            try:
+                parsed = tomllib.loads(document)
+                for i in toml_only:
+                    parsed_arrays[i] = parsed[f"v{i}"]
+            except (tomllib.TOMLDecodeError, ValueError, KeyError):
+                # One bad array spoils the batch, parse them one by one instead
+                for i in toml_only:
+                    parsed_arrays[i] = self.clean_toml_value(array_strs[i])
+
+        return parsed_arrays
+
+    def _strip_inline_comment(self, value_str: str) -> str:
+        """Strip whitespace and any trailing comment from a raw TOML value."""
         value_str = value_str.strip()
-
-        # Remove trailing comments
         if '#' in value_str:
             value_str = value_str.split('#')[0].strip()
+        return value_str
+
+    def clean_toml_value(self, value_str: str) -> Any:
+        """Clean and parse a TOML value string."""
+        value_str = self._strip_inline_comment(value_str)
 
         # Handle arrays
         if value_str.startswith('[') and value_str.endswith(']'):
+            try:
+                return _decode_json_array(value_str)
+            except ValueError:
+                pass
             try:
                 test_toml = f"test = {value_str}"
-                parsed = toml.loads(test_toml)
+                parsed = tomllib.loads(test_toml)
                 return parsed['test']
-            except (toml.TomlDecodeError, ValueError, KeyError):
+            except (tomllib.TOMLDecodeError, ValueError, KeyError):
                 # If parsing fails, return as string
                 return value_str
 
@@ -205,22 +350,26 @@ class CorrectedTomlMigrator:
                           target_config: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
         """Find customizations by comparing source sections with target config."""
         customizations = {}
-        target_flat = self.flatten_config(target_config)
 
         for section_name, section_data in source_sections.items():
             section_customizations = {'regular_props': {}, 'quoted_props': [], 'is_array_table': section_data.get('is_array_table', False)}
+            # Walk down to the matching target table once per section
+            target_section = self._lookup_config(target_config, section_name.split('.'))
 
             # Check regular properties
             for key, value in section_data['regular_props'].items():
-                full_key = f"{section_name}.{key}"
+                target_value = self._lookup_config(target_section, key.split('.') if '.' in key else (key,))
+
+                # Only properties that differ from the target can be customizations
+                if target_value is not _MISSING and self._is_flat_leaf(target_value) \
+                        and str(target_value) == str(value):
+                    continue
 
                 # Skip values matching ignore patterns (including wildcards)
-                if self._matches_ignore_pattern(full_key, value):
+                if self._matches_ignore_pattern(f"{section_name}.{key}", value):
                     continue
 
-                # Check if different from target
-                if full_key not in target_flat or str(target_flat[full_key]) != str(value):
-                    section_customizations['regular_props'][key] = value
+                section_customizations['regular_props'][key] = value
 
             # Always include quoted properties (they're usually customizations)
             section_customizations['quoted_props'] = section_data['quoted_props']
@@ -231,97 +380,131 @@ class CorrectedTomlMigrator:
 
         return customizations
 
-    def flatten_config(self, config: Dict[str, Any], parent_key: str = '', sep: str = '.') -> Dict[str, Any]:
-        """Flatten nested configuration."""
-        items = []
-        for k, v in config.items():
-            new_key = f"{parent_key}{sep}{k}" if parent_key else k
-            if isinstance(v, dict):
-                items.extend(self.flatten_config(v, new_key, sep=sep).items())
-            elif isinstance(v, list) and len(v) > 0 and isinstance(v[0], dict):
-                for i, item in enumerate(v):
-                    items.extend(self.flatten_config(item, f"{new_key}[{i}]", sep=sep).items())
-            else:
-                items.append((new_key, v))
-        return dict(items)
+    def _lookup_config(self, config: Any, path: List[str]) -> Any:
+        """Follow a key path through nested tables, returning _MISSING if it doesn't exist."""
+        node = config
+        for part in path:
+            if not isinstance(node, dict):
+                return _MISSING
+            node = node.get(part, _MISSING)
+            if node is _MISSING:
+                return _MISSING
+        return node
+
+    def _is_flat_leaf(self, value: Any) -> bool:
+        """Check if a value is a single setting rather than a table or an array of tables."""
+        if isinstance(value, dict):
+            return False
+        return not (isinstance(value, list) and len(value) > 0 and isinstance(value[0], dict))
 
     def _extract_section_name(self, line: str, include_commented: bool = False) -> Optional[Tuple[str, bool]]:
         """Extract section name from a line, return None if not a section. Returns (name, is_array_table)."""
-        stripped = line.strip()
+        match = _SEC_RE.match(line)
+        if match is None or (match.group('comment') and not include_commented):
+            return None
 
-        # Check for commented sections if requested
-        if include_commented and stripped.startswith('#['):
-            stripped = stripped[1:].strip()  # Remove leading #
+        array = match.group('array')
+        if array is not None:
+            return (sys.intern(array.strip()), True)
+        return (sys.intern(match.group('table').strip()), False)
 
-        if not (stripped.startswith('[') and stripped.endswith(']')):
-            return None
+    def _classify_lines(self, lines: List[str]) -> List[Optional[Tuple]]:
+        """
+        Tokenize every line once with a single regex match.
 
-        if stripped.startswith('[[') and stripped.endswith(']]'):
-            return (stripped[2:-2].strip(), True)
-        else:
-            return (stripped[1:-1].strip(), False)
+        Section headers, active or commented, become
+        ('section', name, is_array_table, is_commented), key-value pairs,
+        active or commented, become ('property', key, is_commented) and all
+        other lines are None.
+        """
+        classified = []
+        append = classified.append
+        match_line = _LINE_RE.match
+        intern = sys.intern
+        for line in lines:
+            match = match_line(line)
+            if match is None:
+                append(None)
+                continue
+
+            is_commented = match.group('comment') == '#'
+            array, table, key = match.group('array', 'table', 'key')
+            if array is not None:
+                append(('section', intern(array.strip()), True, is_commented))
+            elif table is not None:
+                append(('section', intern(table.strip()), False, is_commented))
+            else:
+                append(('property', key, is_commented))
+        return classified
 
     def _process_section_customization(self, target_lines: List[str], start_idx: int,
-                                     section_name: str, section_custom: Dict[str, Any]) -> Tuple[List[str], int]:
-        """Process customizations for a single section."""
+                                     section_name: str, section_custom: Dict[str, Any],
+                                     classified: Optional[List[Optional[Tuple]]] = None) -> Tuple[List[str], int]:
+        """
+        Process customizations for a single section.
+
+        classified is the _classify_lines() result for target_lines, if the
+        caller has it, to avoid tokenizing the lines again.
+        """
+        if classified is None:
+            classified = self._classify_lines(target_lines)
+
         applied_regular_props = set()
         section_lines = []
         last_property_index = -1
         i = start_idx
 
+        # Bind hot attribute lookups to locals for the per-line loop
+        append = section_lines.append
+        applied = self.applied_changes.append
+        format_value = self.format_toml_value
+        custom_get = section_custom['regular_props'].get
+        line_count = len(target_lines)
+
         # Process lines within this section
-        while i < len(target_lines):
+        while i < line_count:
             line = target_lines[i]
-            stripped = line.strip()
+            token = classified[i]
+
+            # Keep comments, empty lines, etc.
+            if token is None:
+                append(line)
+                i += 1
+                continue
 
             # Stop if we hit another section (including commented ones)
-            section_info = self._extract_section_name(line, include_commented=True)
-            if section_info:
+            if token[0] == 'section':
                 break
 
             # Handle key-value pairs (both active and commented)
-            if '=' in stripped:
-                # Check if it's a commented property
-                is_commented = stripped.startswith('#')
-                line_to_parse = stripped[1:].strip() if is_commented else stripped
-
-                if '=' in line_to_parse:
-                    key_part, value_part = line_to_parse.split('=', 1)
-                    key = key_part.strip()
-
-                    # Check if we have a customization for this key
-                    if key in section_custom['regular_props']:
-                        # Uncomment and replace with customized value
-                        indent = len(line) - len(line.lstrip())
-                        custom_value = section_custom['regular_props'][key]
-                        formatted_value = self.format_toml_value(custom_value)
-                        section_lines.append(' ' * indent + f"{key} = {formatted_value}\n")
-                        self.applied_changes.append(f"{'Uncommented and modified' if is_commented else 'Modified'}: {section_name}.{key}")
-                        applied_regular_props.add(key)
-                        last_property_index = len(section_lines) - 1
-                    else:
-                        # Keep original line (commented or not)
-                        section_lines.append(line)
-                        if not is_commented:
-                            last_property_index = len(section_lines) - 1
-                else:
-                    section_lines.append(line)
+            _, key, is_commented = token
+
+            # Check if we have a customization for this key
+            custom_value = custom_get(key, _MISSING)
+            if custom_value is not _MISSING:
+                # Uncomment and replace with customized value
+                indent = len(line) - len(line.lstrip())
+                formatted_value = format_value(custom_value)
+                append(' ' * indent + f"{key} = {formatted_value}\n")
+                applied(('Uncommented and modified' if is_commented else 'Modified', section_name, key))
+                applied_regular_props.add(key)
+                last_property_index = len(section_lines) - 1
             else:
-                # Keep comments, empty lines, etc.
-                section_lines.append(line)
+                # Keep original line (commented or not)
+                append(line)
+                if not is_commented:
+                    last_property_index = len(section_lines) - 1
 
             i += 1
 
         # Add missing properties
         missing_props = self._build_missing_properties(section_name, section_custom, applied_regular_props)
 
-        # Insert missing properties after the last property
+        # Splice missing properties in after the last property (or at the top
+        # of the section when it has none, as last_property_index is then -1)
         if missing_props:
-            if last_property_index >= 0:
-                for j, prop in enumerate(missing_props):
-                    section_lines.insert(last_property_index + 1 + j, prop)
-            else:
-                section_lines = missing_props + section_lines
+            insert_at = last_property_index + 1
+            section_lines[insert_at:insert_at] = missing_props
 
         return section_lines, i
 
@@ -329,133 +512,152 @@ class CorrectedTomlMigrator:
                                 applied_regular_props: set) -> List[str]:
         """Build list of missing properties to add."""
         missing_props = []
+        added_keys = []
 
         # Add missing regular properties
         for key, value in section_custom['regular_props'].items():
             if key not in applied_regular_props:
                 formatted_value = self.format_toml_value(value)
                 missing_props.append(f"{key} = {formatted_value}\n")
-                self.applied_changes.append(f"Added: {section_name}.{key}")
+                added_keys.append(key)
 
         # Add quoted properties
         for quoted_prop in section_custom['quoted_props']:
             missing_props.append(quoted_prop['line'] + '\n')
-            self.applied_changes.append(f"Added: {section_name}.{quoted_prop['key']}")
+            added_keys.append(quoted_prop['key'])
+
+        self.applied_changes.extend(('Added', section_name, key) for key in added_keys)
 
         return missing_props
 
-    def _get_target_sections(self, target_lines: List[str], include_commented: bool = False) -> set:
-        """Extract all section names from target file."""
-        target_sections = set()
-        for line in target_lines:
-            section_info = self._extract_section_name(line, include_commented=include_commented)
-            if section_info:
-                section_name, _ = section_info
-                target_sections.add(section_name)
-        return target_sections
+    def _index_ordering_rules(self) -> None:
+        """Index the section ordering rules by parent and child section name."""
+        self._parent_of: Dict[str, str] = {}
+        self._children_of: Dict[str, List[str]] = {}
+        self._follow: Dict[str, bool] = {}
 
-    def _get_parent_for_section(self, section_name: str) -> Optional[str]:
-        """Get the parent section for a given section based on ordering rules."""
+        # setdefault keeps the first matching rule, as a linear scan would
         for rule in self.ordering_rules.get('rules', []):
+            parent = rule.get('parent')
+            if parent is None:
+                continue
+            self._follow.setdefault(parent, rule.get('children_must_follow', False))
             if 'child_sections' in rule:
-                if section_name in rule['child_sections']:
-                    return rule['parent']
-        return None
+                self._children_of.setdefault(parent, rule['child_sections'])
+                for child in rule['child_sections']:
+                    self._parent_of.setdefault(child, parent)
+
+    def _get_parent_for_section(self, section_name: str) -> Optional[str]:
+        """Get the parent section for a given section based on ordering rules."""
+        return self._parent_of.get(section_name)
 
     def _get_children_for_parent(self, parent_name: str) -> List[str]:
         """Get ordered list of children for a parent section."""
-        for rule in self.ordering_rules.get('rules', []):
-            if rule.get('parent') == parent_name and 'child_sections' in rule:
-                return rule['child_sections']
-        return []
+        return self._children_of.get(parent_name, [])
 
     def _should_children_follow_parent(self, parent_name: str) -> bool:
         """Check if children must follow parent immediately."""
-        for rule in self.ordering_rules.get('rules', []):
-            if rule.get('parent') == parent_name:
-                return rule.get('children_must_follow', False)
-        return False
+        return self._follow.get(parent_name, False)
 
-    def _add_source_only_sections(self, result_lines: List[str], customizations: Dict[str, Dict[str, Any]],
-                                target_sections: set, processed_sections: set = None) -> None:
-        """Add sections that exist in source but not in target."""
+    def _iter_source_only_sections(self, customizations: Dict[str, Dict[str, Any]],
+                                   target_sections: set, processed_sections: set = None) -> Iterator[str]:
+        """Yield sections that exist in source but not in target."""
         if processed_sections is None:
             processed_sections = set()
 
-        source_only_sections = set(customizations.keys()) - target_sections - processed_sections
+        source_only_sections = [section_name for section_name in customizations
+                                if section_name not in target_sections
+                                and section_name not in processed_sections]
 
         if source_only_sections:
-            result_lines.append("\n# Additional sections from source file\n")
+            yield "\n# Additional sections from source file\n"
 
             # Group sections by parent for proper ordering
-            sections_by_parent = {}
+            sections_by_parent = defaultdict(list)
             orphan_sections = []
 
             for section_name in source_only_sections:
                 parent = self._get_parent_for_section(section_name)
                 if parent:
-                    if parent not in sections_by_parent:
-                        sections_by_parent[parent] = []
                     sections_by_parent[parent].append(section_name)
                 else:
                     orphan_sections.append(section_name)
 
             # Add orphan sections first (those without explicit parent rules)
-            for section_name in sorted(orphan_sections):
-                self._add_section_to_output(result_lines, section_name, customizations[section_name])
+            orphan_sections.sort()
+            for section_name in orphan_sections:
+                yield from self._iter_section_output(section_name, customizations[section_name])
 
                 # Check if this section has children that should follow
                 if self._should_children_follow_parent(section_name):
-                    children = self._get_children_for_parent(section_name)
-                    for child in children:
-                        if child in source_only_sections and child in sections_by_parent.get(section_name, []):
-                            self._add_section_to_output(result_lines, child, customizations[child])
+                    source_children = sections_by_parent.get(section_name, ())
+                    for child in self._get_children_for_parent(section_name):
+                        if child in source_children:
+                            yield from self._iter_section_output(child, customizations[child])
+
+    def _iter_section_output(self, section_name: str, section_custom: Dict[str, Any]) -> Iterator[str]:
+        """Yield the lines of a single section added to the output."""
+        self.emitted_sections.add(section_name)
 
-    def _add_section_to_output(self, result_lines: List[str], section_name: str, section_custom: Dict[str, Any]) -> None:
-        """Add a single section to the output."""
         # Add section header - check if it's an array table
         if section_custom.get('is_array_table', False):
-            result_lines.append(f"\n[[{section_name}]]\n")
+            yield f"\n[[{section_name}]]\n"
         else:
-            result_lines.append(f"\n[{section_name}]\n")
+            yield f"\n[{section_name}]\n"
 
         # Add regular properties
         for key, value in section_custom['regular_props'].items():
             formatted_value = self.format_toml_value(value)
-            result_lines.append(f"{key} = {formatted_value}\n")
-            self.applied_changes.append(f"Added section: {section_name}.{key}")
+            yield f"{key} = {formatted_value}\n"
+            self.applied_changes.append(('Added section', section_name, key))
 
         # Add quoted properties
         for quoted_prop in section_custom['quoted_props']:
-            result_lines.append(quoted_prop['line'] + '\n')
-            self.applied_changes.append(f"Added section: {section_name}.{quoted_prop['key']}")
+            yield quoted_prop['line'] + '\n'
+            self.applied_changes.append(('Added section', section_name, quoted_prop['key']))
 
     def apply_customizations_to_target(self, target_lines: List[str],
                                      customizations: Dict[str, Dict[str, Any]]) -> List[str]:
         """Apply customizations to target file while preserving structure."""
-        result_lines = []
+        return list(self._iter_apply_customizations(target_lines, customizations))
+
+    def _iter_apply_customizations(self, target_lines: List[str],
+                                   customizations: Dict[str, Dict[str, Any]]) -> Iterator[str]:
+        """Yield the target file lines with customizations applied, preserving structure."""
         i = 0
-        # Get both active and commented sections from target
-        target_sections = self._get_target_sections(target_lines, include_commented=True)
+        emitted_sections = self.emitted_sections = set()
+        top_level_keys = self.emitted_top_level_keys = set()
+        # Tokenize the target, including commented sections, in a single pass
+        classified = self._classify_lines(target_lines)
+        target_sections = set()
+        commented_sections = set()
+        for token in classified:
+            if token and token[0] == 'section':
+                target_sections.add(token[1])
+                if token[3]:
+                    commented_sections.add(token[1])
+        # Only commented sections with customizations ever need uncommenting
+        needs_uncomment = {name for name in commented_sections if name in customizations}
         processed_sections = set()  # Track which sections we've processed
+        in_root_table = True
 
         while i < len(target_lines):
             line = target_lines[i]
-            section_info = self._extract_section_name(line)
+            token = classified[i]
+            header = token if token and token[0] == 'section' else None
 
-            # Also check for commented sections
-            commented_section_info = self._extract_section_name(line, include_commented=True)
-
-            if section_info:
-                section_name, _ = section_info
-                result_lines.append(line)
+            if header and not header[3]:
+                section_name = header[1]
+                emitted_sections.add(section_name)
+                in_root_table = False
+                yield line
 
                 # Check if this section has customizations
                 if section_name in customizations:
                     section_custom = customizations[section_name]
                     section_lines, next_i = self._process_section_customization(
-                        target_lines, i + 1, section_name, section_custom)
-                    result_lines.extend(section_lines)
+                        target_lines, i + 1, section_name, section_custom, classified)
+                    yield from section_lines
                     i = next_i
                     processed_sections.add(section_name)
 
@@ -465,30 +667,32 @@ class CorrectedTomlMigrator:
                         for child in children:
                             # Add child if it's in customizations but not in target
                             if child in customizations and child not in target_sections and child not in processed_sections:
-                                self._add_section_to_output(result_lines, child, customizations[child])
+                                yield from self._iter_section_output(child, customizations[child])
                                 processed_sections.add(child)
 
                     continue
-            elif commented_section_info and not section_info:
+            elif header and needs_uncomment:
                 # This is a commented section
-                section_name, is_array_table = commented_section_info
+                _, section_name, is_array_table, _ = header
 
                 # Check if we have customizations for this commented section
-                if section_name in customizations and section_name not in processed_sections:
+                if section_name in needs_uncomment and section_name not in processed_sections:
                     section_custom = customizations[section_name]
 
                     # Uncomment the section header
                     if section_custom.get('is_array_table', False) or is_array_table:
-                        result_lines.append(f"[[{section_name}]]\n")
+                        yield f"[[{section_name}]]\n"
                     else:
-                        result_lines.append(f"[{section_name}]\n")
+                        yield f"[{section_name}]\n"
 
-                    self.applied_changes.append(f"Uncommented section: {section_name}")
+                    self.applied_changes.append(('Uncommented section', section_name, None))
+                    emitted_sections.add(section_name)
+                    in_root_table = False
 
                     # Process the section content
                     section_lines, next_i = self._process_section_customization(
-                        target_lines, i + 1, section_name, section_custom)
-                    result_lines.extend(section_lines)
+                        target_lines, i + 1, section_name, section_custom, classified)
+                    yield from section_lines
                     i = next_i
                     processed_sections.add(section_name)
 
@@ -497,21 +701,22 @@ class CorrectedTomlMigrator:
                         children = self._get_children_for_parent(section_name)
                         for child in children:
                             if child in customizations and child not in target_sections and child not in processed_sections:
-                                self._add_section_to_output(result_lines, child, customizations[child])
+                                yield from self._iter_section_output(child, customizations[child])
                                 processed_sections.add(child)
 
                     continue
                 else:
-                    result_lines.append(line)
+                    yield line
             else:
-                result_lines.append(line)
+                # Keys ahead of the first header belong to the root table
+                if token and token[0] == 'property' and in_root_table and not token[2]:
+                    top_level_keys.add(token[1].partition('.')[0].strip())
+                yield line
 
             i += 1
 
         # Add sections that exist in source but not in target (and haven't been processed)
-        self._add_source_only_sections(result_lines, customizations, target_sections, processed_sections)
-
-        return result_lines
+        yield from self._iter_source_only_sections(customizations, target_sections, processed_sections)
 
     def format_toml_value(self, value: Any) -> str:
         """Format a Python value as TOML string."""
@@ -522,24 +727,33 @@ class CorrectedTomlMigrator:
         elif isinstance(value, (int, float)):
             return str(value)
         elif isinstance(value, list):
-            # Handle arrays properly without extra quotes
-            if all(isinstance(item, str) for item in value):
-                formatted_items = [f'"{item.replace(chr(34), chr(92) + chr(34))}"' for item in value]
-                return '[' + ', '.join(formatted_items) + ']'
-            else:
-                # For mixed types, convert each item properly
-                formatted_items = []
-                for item in value:
-                    if isinstance(item, str):
-                        formatted_items.append(f'"{item}"')
-                    elif isinstance(item, bool):
-                        formatted_items.append('true' if item else 'false')
-                    else:
-                        formatted_items.append(str(item))
-                return '[' + ', '.join(formatted_items) + ']'
+            return self._format_list(value)
         else:
             return f'"{str(value)}"'
 
+    def _format_list(self, value: List[Any]) -> str:
+        """Format a Python list as a TOML array."""
+        # Handle arrays properly without extra quotes
+        if all(isinstance(item, str) for item in value):
+            formatted_items = ['"' + item.translate(_STR_ESCAPE) + '"' for item in value]
+            return '[' + ', '.join(formatted_items) + ']'
+        else:
+            # For mixed types, convert each item properly
+            formatted_items = []
+            for item in value:
+                if isinstance(item, str):
+                    formatted_items.append('"' + item.translate(_STR_ESCAPE) + '"')
+                elif isinstance(item, bool):
+                    formatted_items.append('true' if item else 'false')
+                else:
+                    formatted_items.append(str(item))
+            return '[' + ', '.join(formatted_items) + ']'
+
+    def format_applied_changes(self) -> List[str]:
+        """Describe the applied changes, e.g. 'Modified: server.hostname'."""
+        return [f"{kind}: {section}.{key}" if key is not None else f"{kind}: {section}"
+                for kind, section, key in self.applied_changes]
+
     def migrate(self, create_backup: bool = True, dry_run: bool = False) -> bool:
         """Perform the migration."""
         print(f"Corrected migration preserving section structure: {self.source_file} → {self.target_file}")
@@ -568,9 +782,6 @@ class CorrectedTomlMigrator:
         # Read target file as lines
         target_lines = self.read_file_as_lines(self.target_file)
 
-        # Apply customizations
-        result_lines = self.apply_customizations_to_target(target_lines, customizations)
-
         # Create backup
         if create_backup and self.target_file.exists():
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -578,9 +789,9 @@ class CorrectedTomlMigrator:
             shutil.copy2(self.target_file, backup_file)
             print(f"Backup created: {backup_file}")
 
-        # Write result
-        with open(self.output_file, 'w', encoding='utf-8') as f:
-            f.writelines(result_lines)
+        # Apply customizations and write result, streaming lines straight to the file
+        with open(self.output_file, 'w', encoding='utf-8', buffering=OUTPUT_BUFFER_SIZE) as f:
+            f.writelines(self._iter_apply_customizations(target_lines, customizations))
 
         print(f"Migration completed: {self.output_file}")
         print(f"Applied {len(self.applied_changes)} changes")
@@ -589,12 +800,28 @@ class CorrectedTomlMigrator:
 
         return True
 
-    def validate(self) -> bool:
-        """Validate the migrated configuration."""
+    def validate(self, quick: bool = False) -> bool:
+        """
+        Validate the migrated configuration.
+
+        The output file is fully parsed and inspected. With quick=True the
+        required sections are first looked up in the section headers and
+        top-level keys written by the migration in this run, skipping the
+        parse (and thus the syntax check) when all of them are found.
+        """
         if not self.output_file.exists():
             print("Error: Output file not found")
             return False
 
+        if quick and (self.emitted_sections or self.emitted_top_level_keys):
+            top_level = {name.partition('.')[0].strip() for name in self.emitted_sections}
+            top_level |= self.emitted_top_level_keys
+
+            if all(s in top_level for s in REQUIRED_SECTIONS):
+                print(f"✓ All required sections present")
+                print("  TOML syntax not checked (use --validate for a full parse)")
+                return True
+
         try:
             migrated_config = self.parse_toml_file(self.output_file)
             print("✓ Valid TOML syntax")
@@ -623,7 +850,7 @@ class CorrectedTomlMigrator:
 
             return True
 
-        except (toml.TomlDecodeError, IOError, KeyError) as e:
+        except (tomllib.TOMLDecodeError, IOError, KeyError) as e:
             print(f"✗ Validation failed: {e}")
             return False
 
@@ -639,6 +866,8 @@ def main():
     parser.add_argument('--no-backup', action='store_true', help='Skip backup creation')
     parser.add_argument('--dry-run', action='store_true', help='Preview changes only')
     parser.add_argument('--validate', action='store_true', help='Validate migrated config')
+    parser.add_argument('--quick-validate', action='store_true',
+                        help='Only check the required sections were written, without parsing the output')
 
     args = parser.parse_args()
 
@@ -661,8 +890,8 @@ def main():
         sys.exit(1)
 
     # Validate if requested
-    if args.validate and not args.dry_run:
-        if not migrator.validate():
+    if (args.validate or args.quick_validate) and not args.dry_run:
+        if not migrator.validate(quick=args.quick_validate and not args.validate):
             sys.exit(1)
 
 